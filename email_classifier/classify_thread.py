@@ -2,43 +2,193 @@ import argparse
 import sys
 import json
 import hashlib
+import io
+import multiprocessing
 import os
+from collections import OrderedDict
+from functools import partial
 from rules import classify_labels
 
+try:  # optional: faster JSON (pip install orjson)
+    import orjson
+except ImportError:
+    orjson = None
+
+LABEL_CACHE_SIZE = 4096
+_label_cache = OrderedDict()  # (thread_id, bodies_hash) -> label, LRU
+
 # ---------------- Core helpers ----------------
 
+_EMPTY_THREAD = {}
+
+
 def normalize_thread(thread):
-    subject = (thread or {}).get("subject", "") or ""
-    messages = (thread or {}).get("messages", []) or []
+    t = thread or _EMPTY_THREAD
+    subject = t.get("subject") or ""
+    messages = t.get("messages") or []
+    setdefault = dict.setdefault  # tránh lookup method mỗi lần gọi
     for msg in messages:
-        msg.setdefault("timestamp", "")
-        msg.setdefault("from", "")
-        msg.setdefault("to", [])
-        msg.setdefault("body", "")
+        setdefault(msg, "timestamp", "")
+        setdefault(msg, "from", "")
+        setdefault(msg, "to", [])
+        setdefault(msg, "body", "")
     return subject, messages
 
 
+def _timestamp_key(msg):
+    return msg.get("timestamp", "") or ""
+
+
 def sort_messages(messages):
-    # Python sort là stable, nên khi timestamp trùng sẽ giữ nguyên thứ tự gốc
-    return sorted(messages, key=lambda m: m.get("timestamp", "") or "")
+    # Python sort là stable, nên khi timestamp trùng sẽ giữ nguyên thứ tự gốc.
+    # Timsort đã O(n) với input đã sắp xếp -> không cần fast-path kiểm tra trước.
+    return sorted(messages, key=_timestamp_key)
+
+
+# thread_id chỉ là định danh opaque, không mang tính bảo mật -> hash nào cũng được.
+# Mặc định giữ SHA-1 để id tương thích với output cũ; THREAD_ID_ALGO=blake2b
+# nhanh hơn và cùng độ dài (40 hex).
+THREAD_ID_ALGOS = {
+    "sha1": lambda basis: hashlib.sha1(basis).hexdigest(),
+    "blake2b": lambda basis: hashlib.blake2b(basis, digest_size=20).hexdigest(),
+}
+THREAD_ID_ALGO = os.environ.get("THREAD_ID_ALGO", "sha1").strip().lower()
+if THREAD_ID_ALGO not in THREAD_ID_ALGOS:
+    raise ValueError(
+        f"Unsupported THREAD_ID_ALGO={THREAD_ID_ALGO!r} "
+        f"(expected one of: {', '.join(THREAD_ID_ALGOS)})"
+    )
+_thread_hash = THREAD_ID_ALGOS[THREAD_ID_ALGO]
 
 
 def compute_thread_id(subject, messages_sorted):
     first_ts = messages_sorted[0]["timestamp"] if messages_sorted else ""
     last_ts = messages_sorted[-1]["timestamp"] if messages_sorted else ""
     basis = (subject + first_ts + last_ts).encode("utf-8")
-    return hashlib.sha1(basis).hexdigest()  # hex lowercase
+    return _thread_hash(basis)  # hex lowercase
+
+
+def compute_bodies_hash(subject, messages_sorted):
+    # Length-prefix từng phần để không có hai thread khác nhau cho cùng digest;
+    # body không phải str vẫn được phân biệt (rules coi nó là chuỗi rỗng nhưng vẫn đếm).
+    h = hashlib.blake2b(digest_size=8)
+    for part in [subject] + [m.get("body") for m in messages_sorted]:
+        if isinstance(part, str):
+            raw = part.encode("utf-8", "surrogatepass")
+            h.update(b"s" + len(raw).to_bytes(8, "little"))
+            h.update(raw)
+        else:
+            h.update(b"t" if part else b"f")
+    return h.digest()
 
 
-def classify_thread(data):
+def _classify_cached(thread_id, bodies_hash, subject, messages_sorted):
+    key = (thread_id, bodies_hash)
+    label = _label_cache.get(key)
+    if label is None:
+        label = classify_labels(subject, messages_sorted)
+        _label_cache[key] = label
+        if len(_label_cache) > LABEL_CACHE_SIZE:
+            _label_cache.popitem(last=False)
+    else:
+        _label_cache.move_to_end(key)
+    # Trả bản sao để caller sửa kết quả không làm hỏng cache
+    return {**label, "attachments": list(label["attachments"])}
+
+
+def classify_thread(data, use_cache=True):
     thread = (data or {}).get("thread", {}) or {}
     subject, messages = normalize_thread(thread)
     messages_sorted = sort_messages(messages)
     thread_id = compute_thread_id(subject, messages_sorted)
-    label = classify_labels(subject, messages_sorted)
+    if use_cache:
+        bodies_hash = compute_bodies_hash(subject, messages_sorted)
+        label = _classify_cached(thread_id, bodies_hash, subject, messages_sorted)
+    else:
+        label = classify_labels(subject, messages_sorted)
     return {"thread_id": thread_id, "label": label}
 
 
+# ---------------- JSON I/O ----------------
+
+def load_json(raw):
+    """Parse JSON from bytes or str."""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def dump_json(obj):
+    """Pretty JSON (indent=2, UTF-8 không escape) as UTF-8 bytes."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+    return json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8")
+
+
+def print_json(obj):
+    """Write pretty JSON + newline thẳng vào byte stream của stdout (không qua str)."""
+    out = getattr(sys.stdout, "buffer", None)
+    if out is None:  # stdout đã bị thay bằng text stream (vd. StringIO)
+        print(dump_json(obj).decode("utf-8"))
+        return
+    sys.stdout.flush()  # giữ đúng thứ tự với các print() trước đó
+    out.write(dump_json(obj))
+    out.write(b"\n")
+    out.flush()
+
+
+def dump_json_line(obj):
+    """Compact JSON + newline as UTF-8 bytes (một dòng NDJSON)."""
+    if orjson is not None:
+        return orjson.dumps(obj) + b"\n"
+    return (json.dumps(obj, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+# ---------------- Batch (NDJSON) ----------------
+
+BATCH_CHUNKSIZE = 256
+
+
+def _iter_ndjson(in_f):
+    for lineno, line in enumerate(in_f, 1):
+        if not line.strip():
+            continue
+        try:
+            yield load_json(line)
+        except ValueError as e:
+            raise ValueError(f"Invalid JSON on input line {lineno}: {e}") from e
+
+
+def run_batch(in_f, out_f, jobs=1, use_cache=True):
+    """
+    Classify một thread mỗi dòng (NDJSON) từ in_f, ghi kết quả NDJSON ra out_f
+    (cả hai ở chế độ binary). Thứ tự output giữ đúng thứ tự input.
+    Regex/automaton chỉ build một lần cho cả batch; jobs > 1 chia cho nhiều process.
+    """
+    classify = partial(classify_thread, use_cache=use_cache)
+    threads = _iter_ndjson(in_f)
+    if jobs > 1:
+        # Lỗi parse không được lọt vào pool: imap sẽ fail cả chunk chứa dòng lỗi và
+        # làm mất kết quả các dòng tốt trước đó. Dừng đọc, ghi hết, rồi mới raise
+        # -> output giống hệt jobs=1.
+        parse_errors = []
+
+        def parsed():
+            try:
+                yield from threads
+            except ValueError as e:
+                parse_errors.append(e)
+
+        with multiprocessing.Pool(jobs) as pool:
+            for result in pool.imap(classify, parsed(), chunksize=BATCH_CHUNKSIZE):
+                out_f.write(dump_json_line(result))
+        if parse_errors:
+            raise parse_errors[0]
+    else:
+        for data in threads:
+            out_f.write(dump_json_line(classify(data)))
+
+
 # ---------------- CLI (tham số) ----------------
 
 def parse_args(argv):
@@ -54,7 +204,25 @@ def parse_args(argv):
         "--out", dest="output", default=None,
         help="Output JSON file (or STDOUT if omitted)"
     )
-    return parser.parse_args(argv)
+    parser.add_argument(
+        "--no-cache", dest="no_cache", action="store_true",
+        help="Disable the in-process label cache (for debugging)"
+    )
+    parser.add_argument(
+        "--batch", action="store_true",
+        help="Read NDJSON (one thread per line) and write NDJSON results"
+    )
+    parser.add_argument(
+        "--jobs", type=int, default=None,
+        help="Worker processes for --batch (0 = all CPUs, default 1)"
+    )
+    args = parser.parse_args(argv)
+    if args.jobs is not None:
+        if not args.batch:
+            parser.error("--jobs requires --batch")
+        if args.jobs < 0:
+            parser.error("--jobs must be >= 0")
+    return args
 
 
 def main_cli(argv):
@@ -63,22 +231,36 @@ def main_cli(argv):
     """
     args = parse_args(argv)
 
+    if args.batch:
+        jobs = 1 if args.jobs is None else (args.jobs or os.cpu_count() or 1)
+        in_f = sys.stdin.buffer if args.input == "-" else open(args.input, "rb")
+        out_f = open(args.output, "wb") if args.output else sys.stdout.buffer
+        try:
+            run_batch(in_f, out_f, jobs=jobs, use_cache=not args.no_cache)
+        finally:
+            if in_f is not sys.stdin.buffer:
+                in_f.close()
+            if out_f is not sys.stdout.buffer:
+                out_f.close()
+            else:
+                out_f.flush()
+        return
+
     # Read input
     if args.input == "-":
-        data = json.load(sys.stdin)
+        data = load_json(sys.stdin.buffer.read())
     else:
-        with open(args.input, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        with open(args.input, "rb") as f:
+            data = load_json(f.read())
 
-    result = classify_thread(data)
+    result = classify_thread(data, use_cache=not args.no_cache)
 
     # Write output
     if args.output:
-        with open(args.output, "w", encoding="utf-8") as f:
-            json.dump(result, f, ensure_ascii=False, indent=2)
+        with open(args.output, "wb") as f:
+            f.write(dump_json(result))
     else:
-        json.dump(result, sys.stdout, ensure_ascii=False, indent=2)
-        print()
+        print_json(result)
 
 
 # ---------------- Interactive ----------------
@@ -98,23 +280,23 @@ def interactive_cli():
                 print("File not found.")
                 continue
             try:
-                with open(path, "r", encoding="utf-8") as f:
-                    data = json.load(f)
+                with open(path, "rb") as f:
+                    data = load_json(f.read())
                 result = classify_thread(data)
                 print("\nClassification result:")
-                print(json.dumps(result, ensure_ascii=False, indent=2))
+                print_json(result)
                 save = input("Save result to file? [y/N]: ").strip().lower()
                 if save == "y":
                     out_path = input("Enter output file path: ").strip()
-                    with open(out_path, "w", encoding="utf-8") as out_f:
-                        json.dump(result, out_f, ensure_ascii=False, indent=2)
+                    with open(out_path, "wb") as out_f:
+                        out_f.write(dump_json(result))
                     print(f"Result saved to {out_path}")
             except Exception as e:
                 print(f"Error: {e}")
 
         elif choice == "2":
             print("Paste your thread JSON below (end with an empty line):")
-            lines = []
+            buf = io.StringIO()
             while True:
                 try:
                     line = input()
@@ -122,17 +304,18 @@ def interactive_cli():
                     break
                 if line.strip() == "":
                     break
-                lines.append(line)
+                buf.write(line)
+                buf.write("\n")
             try:
-                data = json.loads("\n".join(lines))
+                data = load_json(buf.getvalue())
                 result = classify_thread(data)
                 print("\nClassification result:")
-                print(json.dumps(result, ensure_ascii=False, indent=2))
+                print_json(result)
                 save = input("Save result to file? [y/N]: ").strip().lower()
                 if save == "y":
                     out_path = input("Enter output file path: ").strip()
-                    with open(out_path, "w", encoding="utf-8") as out_f:
-                        json.dump(result, out_f, ensure_ascii=False, indent=2)
+                    with open(out_path, "wb") as out_f:
+                        out_f.write(dump_json(result))
                     print(f"Result saved to {out_path}")
             except Exception as e:
                 print(f"Error: {e}")
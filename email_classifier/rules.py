@@ -10,18 +10,38 @@ Giữ nguyên tương thích:
 """
 from __future__ import annotations
 import re
-from typing import List, Dict, Any
+import sys
+from functools import lru_cache
+from typing import Dict, Any, Callable, Mapping, Optional, Sequence, Tuple
+
+try:  # optional: linear-time engine (pip install google-re2)
+    import re2 as re_engine  # type: ignore[import-not-found]
+except ImportError:
+    re_engine = None
+
+try:  # optional: multi-keyword prefilter in one pass (pip install pyahocorasick)
+    import ahocorasick  # type: ignore[import-not-found]
+except ImportError:
+    ahocorasick = None
 
 # ------------------------------
 # Precompiled, bilingual patterns
 # ------------------------------
+# Từ tiếng Việt được so khớp nguyên dấu, cố ý không bỏ dấu (ASCII-fold) trước khi
+# match: bỏ dấu sẽ gộp các từ khác nghĩa mà rule đang phân biệt -- hoãn/hoàn
+# (resched vs resolved), ngày/ngay ("ngày mai" thành urgent), gấp/gap, họp/hop.
+# Sửa/thêm nhánh nào ở đây thì phải cập nhật ANCHORS (và SCAN_PLAN nếu là
+# RE_TIME_PROPOSE) cho khớp, nếu không prefilter sẽ loại mất match;
+# tests/test_rules.py đối chiếu scan() với từng pattern trên tests/scan_corpus.json.
 # Scheduling
-RE_TIME_PROPOSE = re.compile(
+_PROPOSE_WORDS = (
     r"(?:(?:meet(?:ing)?|schedule|call|zoom|teams|hangout|cuộc\s*họp|đặt\s*lịch|họp)\b)"
     r"|(?:\b(?:mon|tue|wed|thu|fri|sat|sun)\b)"
-    r"|(?:\bth(?:ứ)?\s*[2-7]\b)"
-    r"|(?:\b\d{1,2}[:h\.]\d{2}\b)"
-    , re.IGNORECASE
+)
+_PROPOSE_THU = r"(?:\bth(?:ứ)?\s*[2-7]\b)"
+_PROPOSE_CLOCK = r"(?:\b\d{1,2}[:h\.]\d{2}\b)"
+RE_TIME_PROPOSE = re.compile(
+    _PROPOSE_WORDS + "|" + _PROPOSE_THU + "|" + _PROPOSE_CLOCK, re.IGNORECASE
 )
 RE_TIME_CONFIRM = re.compile(
     r"\b(?:confirm(?:ed)?|see\s*you|approved|ok(?:ay)?|sounds\s*good|"
@@ -84,100 +104,406 @@ RE_MEET = re.compile(r"\b(?:meet(?:ing)?|schedule|call|họp|lịch|zoom)\b", re
 
 
 # ------------------------------
-# Helpers
+# Output labels (interned, dùng chung cho mọi kết quả)
 # ------------------------------
-def _lower(s: str) -> str:
-    return s.lower() if isinstance(s, str) else ""
+REQ_SCHEDULE_MEET = sys.intern("SCHEDULE/MEET")
+REQ_PROVIDE_DOCS = sys.intern("PROVIDE_DOCS")
+REQ_REVIEW_APPROVE = sys.intern("REVIEW/APPROVE")
+REQ_EDIT_REVISE = sys.intern("EDIT/REVISE")
+REQ_INFO_ONLY = sys.intern("INFO_ONLY")
+
+URG_URGENT = sys.intern("URGENT-24H")
+URG_STD = sys.intern("STD-48H")
+URG_LOW = sys.intern("LOW-120H")
+
+STATE_NEW = sys.intern("NEW")
+STATE_FOLLOW_UP = sys.intern("FOLLOW-UP")
+STATE_RESOLVED = sys.intern("RESOLVED")
+
+SCHED_PROPOSED = sys.intern("PROPOSED_TIME")
+SCHED_CONFIRMED = sys.intern("CONFIRMED_TIME")
+SCHED_RESCHEDULE = sys.intern("RESCHEDULE")
+SCHED_NO_MEETING = sys.intern("NO_MEETING")
+
+ATT_ATTACHED = sys.intern("ATTACHED")
+ATT_EXPECTING = sys.intern("EXPECTING_ATTACHMENT")
+ATT_NONE = sys.intern("NONE_MENTIONED")
 
-def _last_texts(messages: List[Dict[str, Any]], k: int = 3) -> List[str]:
-    """Return lowercased body of last k messages (available)."""
-    bodies = [ _lower(m.get("body", "")) for m in messages if m and m.get("body") ]
-    return bodies[-k:] if bodies else []
+TONE_POSITIVE = sys.intern("POSITIVE")
+TONE_NEUTRAL = sys.intern("NEUTRAL")
+TONE_FRUSTRATED = sys.intern("FRUSTRATED")
+
+# key 2-bit: bit0 = attached, bit1 = expecting
+ATTACH_TABLE = {
+    0b00: (ATT_NONE,),
+    0b01: (ATT_ATTACHED,),
+    0b10: (ATT_EXPECTING,),
+    0b11: (ATT_ATTACHED, ATT_EXPECTING),
+}
 
 
 # ------------------------------
-# Core classification (thread-aware)
+# Scan plan: one pass per text -> bitmask of categories that fired
 # ------------------------------
-def classify_labels(subject: str, messages: List[Dict[str, Any]]) -> Dict[str, Any]:
-    """
-    Drop-in replacement: more robust bilingual rules & precedence.
+PATTERNS = (
+    ("confirm", RE_TIME_CONFIRM),
+    ("resched", RE_TIME_RESCHED),
+    ("propose", RE_TIME_PROPOSE),
+    ("attached", RE_ATTACH_ATTACHED),
+    ("expect", RE_ATTACH_EXPECT),
+    ("urgent", RE_URGENT),
+    ("low", RE_LOW),
+    ("tone_pos", RE_TONE_POS),
+    ("tone_frus", RE_TONE_FRUS),
+    ("followup", RE_FOLLOWUP),
+    ("resolved", RE_RESOLVED),
+    ("review", RE_REVIEW),
+    ("edit", RE_EDIT),
+    ("provide_docs", RE_PROVIDE_DOCS),
+    ("meet", RE_MEET),
+)
+BIT = {name: 1 << i for i, (name, _) in enumerate(PATTERNS)}
+ALL_BITS = (1 << len(PATTERNS)) - 1
+
+CONFIRM_BIT = BIT["confirm"]
+RESCHED_BIT = BIT["resched"]
+PROPOSE_BIT = BIT["propose"]
+ATTACHED_BIT = BIT["attached"]
+EXPECT_BIT = BIT["expect"]
+URGENT_BIT = BIT["urgent"]
+LOW_BIT = BIT["low"]
+TONE_POS_BIT = BIT["tone_pos"]
+TONE_FRUS_BIT = BIT["tone_frus"]
+FOLLOWUP_BIT = BIT["followup"]
+RESOLVED_BIT = BIT["resolved"]
+REVIEW_BIT = BIT["review"]
+EDIT_BIT = BIT["edit"]
+PROVIDE_DOCS_BIT = BIT["provide_docs"]
+MEET_BIT = BIT["meet"]
+
+# Category nào được xét trên scope nào (all_text / tail / last message)
+SCOPE_ALL = (PROPOSE_BIT | MEET_BIT | ATTACHED_BIT | EXPECT_BIT | REVIEW_BIT | EDIT_BIT
+             | PROVIDE_DOCS_BIT | URGENT_BIT | LOW_BIT | FOLLOWUP_BIT)
+SCOPE_LAST_ANY = CONFIRM_BIT | RESCHED_BIT | RESOLVED_BIT | TONE_POS_BIT | TONE_FRUS_BIT
+SCOPE_LAST1 = TONE_POS_BIT | TONE_FRUS_BIT
+# Chỉ dùng cho request_type (expect/attached còn cần cho attachments)
+_REQUEST_TYPE_BITS = MEET_BIT | REVIEW_BIT | EDIT_BIT | PROVIDE_DOCS_BIT
+
+# Literal bắt buộc: mọi nhánh của pattern đều chứa ít nhất một anchor (text đã lower),
+# nên không có anchor nào -> chắc chắn không match, khỏi chạy regex.
+# "propose" chỉ áp cho phần từ khoá; phần "thứ N" và giờ có prefilter riêng.
+ANCHORS = {
+    "confirm": ("confirm", "see", "approved", "ok", "sounds", "xác", "đồng", "hẹn"),
+    "resched": ("schedule", "resched", "move", "postpone", "delay", "push",
+                "đổi", "hoãn", "lùi", "chuyển"),
+    "propose": ("meet", "schedule", "call", "zoom", "teams", "hangout", "họp", "lịch",
+                "mon", "tue", "wed", "thu", "fri", "sat", "sun"),
+    "attached": ("attach", "pfa", "enclosed", "đính"),
+    "expect": ("send", "provide", "share", "forward", "lòng", "xin", "gửi", "chờ"),
+    "urgent": ("urgent", "asap", "eod", "tomorrow", "today", "khẩn", "gấp", "ngay",
+               "ngày", "sớm"),
+    "low": ("rush", "when", "rảnh", "vội"),
+    "tone_pos": ("thank", "appreciat", "cheers", "cảm", "trân", "tuyệt", "rất"),
+    "tone_frus": ("sorry", "apolog", "frustrat", "happy", "angry", "delay", "blocked",
+                  "issue", "problem", "lỗi", "hài", "bực", "chậm", "trục", "vấn"),
+    "followup": ("follow", "reminder", "ping", "nhắc"),
+    "resolved": ("resolved", "fixed", "done", "completed", "closed", "xong", "hoàn", "xử"),
+    "review": ("review", "approv", "duyệt", "kiểm", "xác"),
+    "edit": ("edit", "revis", "sửa"),
+    "provide_docs": ("doc", "file", "tài"),
+    "meet": ("meet", "schedule", "call", "họp", "lịch", "zoom"),
+}
+
+# Probe rẻ (một literal / một lớp ký tự) cho các phần không có từ khoá.
+_HAS_DIGIT = re.compile(r"\d").search
+_HAS_TH = re.compile(r"th").search
+
+Probe = Callable[[str], Any]
+
+# (category, pattern source, anchors, probe): prefilter là tuple anchor (qua AC hoặc
+# `in`) hoặc một hàm probe; regex đầy đủ chỉ chạy khi prefilter qua.
+SCAN_PLAN: Tuple[Tuple[str, str, Optional[Tuple[str, ...]], Optional[Probe]], ...] = tuple(
+    (name, pat.pattern, ANCHORS[name], None) for name, pat in PATTERNS if name != "propose"
+) + (
+    ("propose", _PROPOSE_WORDS, ANCHORS["propose"], None),
+    ("propose", _PROPOSE_THU, None, _HAS_TH),
+    ("propose", _PROPOSE_CLOCK, None, _HAS_DIGIT),
+)
+
+# RE2 chỉ hiểu \b, \s, \d theo ASCII -> "đồng ý\b", "\bđã" sẽ không match.
+# Dịch sang lớp ký tự Unicode tương đương của `re`. Mọi \b trong PATTERNS đều
+# nằm cạnh một ký tự word, nên với search() dạng boolean có thể thay bằng một
+# ranh giới "ăn" ký tự: đầu/cuối text hoặc một ký tự non-word
+# (tests/test_re2.py kiểm tra điều kiện này và đối chiếu RE2 với `re`).
+_RE2_ESCAPES = (
+    (r"\b", r"(?:^|$|[^\pL\pN_])"),
+    (r"\s", r"[\t-\r\x{1c}-\x{1f}\x{85}\pZ]"),
+    (r"\d", r"\p{Nd}"),
+)
+
+
+def _to_re2(source: str) -> str:
+    for esc, repl in _RE2_ESCAPES:
+        source = source.replace(esc, repl)
+    return source
+
+
+def _compile_scan(source: str) -> Any:
+    # Giữ IGNORECASE: ngoài chữ hoa, nó còn khớp "ı" với i và "ſ" với s -- hai ký tự
+    # lower() không đổi, nên text đã lower() vẫn cần cờ này để giữ đúng ngữ nghĩa.
+    if re_engine is not None:
+        return re_engine.compile("(?i)" + _to_re2(source))
+    return re.compile(source, re.IGNORECASE)
+
+
+# Mỗi entry của SCAN_PLAN có một bit riêng (ebit) để đánh dấu ứng viên.
+_ENTRIES = tuple(
+    (BIT[name], 1 << i, _compile_scan(source).search)
+    for i, (name, source, _, _) in enumerate(SCAN_PLAN)
+)
+_ANCHOR_CHECKS = tuple(
+    (BIT[name], 1 << i, anchors) for i, (name, _, anchors, _) in enumerate(SCAN_PLAN)
+    if anchors is not None
+)
+_PROBE_CHECKS = tuple(
+    (BIT[name], 1 << i, probe) for i, (name, _, _, probe) in enumerate(SCAN_PLAN)
+    if probe is not None
+)
+
+# IGNORECASE của `re` khớp "ı" với i, "ſ" với s; anchor (`in`/AC) không qua cờ này
+# và RE2 (?i) không gộp "ı" -> gộp sẵn trên text. Pattern không chứa hai ký tự này
+# nên kết quả vẫn đúng như `re` IGNORECASE trên text gốc.
+_CASE_FOLD = str.maketrans("ıſ", "is")
+
+_AC = None
+_AC_ITER = None  # bound method, tránh lookup `.iter` mỗi lần gọi
+_AC_ALL = 0
+if ahocorasick is not None:
+    _kw_ebits: Dict[str, int] = {}
+    for _, _ebit, _kws in _ANCHOR_CHECKS:
+        _AC_ALL |= _ebit
+        for _kw in _kws:
+            _kw_ebits[_kw] = _kw_ebits.get(_kw, 0) | _ebit
+    _AC = ahocorasick.Automaton()
+    for _kw, _ebit in _kw_ebits.items():
+        _AC.add_word(_kw, _ebit)
+    _AC.make_automaton()
+    _AC_ITER = _AC.iter
+
+
+def _candidates(text: str, want: int) -> int:
+    """Entry bits (thuộc category trong want) có prefilter qua được trên text."""
+    cand = 0
+    if _AC_ITER is not None:
+        for _, ebits in _AC_ITER(text):
+            cand |= ebits
+            if cand == _AC_ALL:
+                break
+    else:
+        for bit, ebit, kws in _ANCHOR_CHECKS:
+            if want & bit:
+                for kw in kws:
+                    if kw in text:
+                        cand |= ebit
+                        break
+    for bit, ebit, probe in _PROBE_CHECKS:
+        if want & bit and probe(text):
+            cand |= ebit
+    return cand
+
+
+def scan(text: str, want: int = ALL_BITS) -> int:
+    """Return bitmask of the wanted categories whose pattern occurs in (lowercased) text.
+
+    Một alternation gộp (?P<name>...)|... chạy chậm hơn so với các pattern riêng
+    trên engine `re`, nên mỗi category vẫn search riêng -- nhưng mỗi text chỉ
+    quét đúng một lần cho mỗi category.
     """
-    subj = _lower(subject)
-    bodies = [ _lower(m.get("body", "")) for m in messages if m.get("body") ]
-    all_text = " ".join(bodies + [subj])
-    last = _last_texts(messages, k=3)  # tail window
-    last1 = last[-1] if last else ""
-    last_any = " ".join(last)
+    mask = 0
+    if not text or not want:
+        return mask
+    if "ı" in text or "ſ" in text:
+        text = text.translate(_CASE_FOLD)
+    cand = _candidates(text, want)
+    for bit, ebit, search in _ENTRIES:
+        if cand & ebit and want & bit and not mask & bit and search(text):
+            mask |= bit
+    return mask
+
+
+def _pending_all(mask_all: int, mask_last_any: int, n: int) -> int:
+    """SCOPE_ALL bits that can still change the result, given what was found so far."""
+    want = SCOPE_ALL & ~mask_all
+    if mask_last_any & (CONFIRM_BIT | RESCHED_BIT):
+        # scheduling đã chốt bởi tail -> propose không còn ý nghĩa, request_type = MEET
+        want &= ~(PROPOSE_BIT | _REQUEST_TYPE_BITS)
+    elif mask_all & (PROPOSE_BIT | MEET_BIT):
+        want &= ~_REQUEST_TYPE_BITS
+    if mask_all & URGENT_BIT:
+        want &= ~LOW_BIT
+    if n > 1 or mask_last_any & RESOLVED_BIT:
+        want &= ~FOLLOWUP_BIT
+    return want
+
+
+def _pending_tail(mask_last_any: int) -> int:
+    """SCOPE_LAST_ANY bits still worth looking for in the tail."""
+    want = SCOPE_LAST_ANY & ~mask_last_any
+    if mask_last_any & CONFIRM_BIT:
+        want &= ~RESCHED_BIT
+    return want
+
+
+# Request type là hàm thuần của vài bit + cờ "đã có meeting" (scheduling khác
+# NO_MEETING) -> tính sẵn cho mọi tổ hợp, _decide chỉ việc tra bảng.
+_HAS_MEETING = 1 << len(PATTERNS)
+REQUEST_TYPE_INPUTS = (_HAS_MEETING | MEET_BIT | EXPECT_BIT | ATTACHED_BIT | REVIEW_BIT
+                       | EDIT_BIT | PROVIDE_DOCS_BIT)
+
+
+def _request_type(key: int) -> str:
+    """Priority: meet > provide docs > review > edit > info."""
+    if key & (MEET_BIT | _HAS_MEETING):
+        return REQ_SCHEDULE_MEET
+    if key & EXPECT_BIT and not key & ATTACHED_BIT:
+        return REQ_PROVIDE_DOCS
+    if key & REVIEW_BIT:
+        return REQ_REVIEW_APPROVE
+    if key & EDIT_BIT:
+        return REQ_EDIT_REVISE
+    if key & PROVIDE_DOCS_BIT:
+        return REQ_PROVIDE_DOCS
+    return REQ_INFO_ONLY
+
+
+def _build_request_type_table() -> Dict[int, str]:
+    table = {}
+    key = REQUEST_TYPE_INPUTS
+    while True:  # duyệt mọi tập con bit của REQUEST_TYPE_INPUTS
+        table[key] = _request_type(key)
+        if not key:
+            return table
+        key = (key - 1) & REQUEST_TYPE_INPUTS
+
+
+REQUEST_TYPE_TABLE = _build_request_type_table()
+
 
+# (request_type, urgency, thread_state, scheduling, attachments, tone)
+Label = Tuple[str, str, str, str, Tuple[str, ...], str]
+
+
+@lru_cache(maxsize=4096)
+def _decide(mask_all: int, mask_last_any: int, mask_last1: int, n_gt_1: bool) -> Label:
+    """Pure decision ladder: scope bitmasks -> label tuple (memoized).
+
+    Nhiều thread có cùng tổ hợp mask (vd. thread "trơn" -> toàn 0), nên phần lớn
+    lời gọi chỉ là một lần tra cache.
+    """
     # ---- Scheduling outcome (Confirm > Reschedule > Propose > None) ----
-    if RE_TIME_CONFIRM.search(last_any):
-        scheduling = "CONFIRMED_TIME"
-    elif RE_TIME_RESCHED.search(last_any):
-        scheduling = "RESCHEDULE"
-    elif RE_TIME_PROPOSE.search(all_text):
-        scheduling = "PROPOSED_TIME"
+    if mask_last_any & CONFIRM_BIT:
+        scheduling = SCHED_CONFIRMED
+    elif mask_last_any & RESCHED_BIT:
+        scheduling = SCHED_RESCHEDULE
+    elif mask_all & PROPOSE_BIT:
+        scheduling = SCHED_PROPOSED
     else:
-        scheduling = "NO_MEETING"
+        scheduling = SCHED_NO_MEETING
 
     # ---- Request type (priority: meet > provide docs > review > edit > info) ----
-    if RE_MEET.search(all_text) or scheduling in {"PROPOSED_TIME", "CONFIRMED_TIME", "RESCHEDULE"}:
-        request_type = "SCHEDULE/MEET"
-    elif RE_ATTACH_EXPECT.search(all_text) and not RE_ATTACH_ATTACHED.search(all_text):
-        request_type = "PROVIDE_DOCS"
-    elif RE_REVIEW.search(all_text):
-        request_type = "REVIEW/APPROVE"
-    elif RE_EDIT.search(all_text):
-        request_type = "EDIT/REVISE"
-    elif RE_PROVIDE_DOCS.search(all_text):
-        request_type = "PROVIDE_DOCS"
-    else:
-        request_type = "INFO_ONLY"
+    has_meeting = _HAS_MEETING if scheduling is not SCHED_NO_MEETING else 0
+    request_type = REQUEST_TYPE_TABLE[mask_all & REQUEST_TYPE_INPUTS | has_meeting]
 
     # ---- Attachments (multi-label) ----
-    attachments = []
-    if RE_ATTACH_ATTACHED.search(all_text):
-        attachments.append("ATTACHED")
-    if RE_ATTACH_EXPECT.search(all_text):
-        attachments.append("EXPECTING_ATTACHMENT")
-    if not attachments:
-        attachments = ["NONE_MENTIONED"]
+    attachments = ATTACH_TABLE[bool(mask_all & ATTACHED_BIT) | bool(mask_all & EXPECT_BIT) << 1]
 
     # ---- Urgency ----
-    if RE_URGENT.search(all_text):
-        urgency = "URGENT-24H"
-    elif RE_LOW.search(all_text):
-        urgency = "LOW-120H"
+    if mask_all & URGENT_BIT:
+        urgency = URG_URGENT
+    elif mask_all & LOW_BIT:
+        urgency = URG_LOW
     else:
-        urgency = "STD-48H"
+        urgency = URG_STD
 
     # ---- Tone (prefer last message) ----
-    if RE_TONE_FRUS.search(last1) and not RE_TONE_POS.search(last1):
-        tone = "FRUSTRATED"
-    elif RE_TONE_POS.search(last1) and not RE_TONE_FRUS.search(last1):
-        tone = "POSITIVE"
+    if mask_last1 & TONE_FRUS_BIT and not mask_last1 & TONE_POS_BIT:
+        tone = TONE_FRUSTRATED
+    elif mask_last1 & TONE_POS_BIT and not mask_last1 & TONE_FRUS_BIT:
+        tone = TONE_POSITIVE
     else:
         # fall back to any tone seen across the tail
-        if RE_TONE_POS.search(last_any) and not RE_TONE_FRUS.search(last_any):
-            tone = "POSITIVE"
-        elif RE_TONE_FRUS.search(last_any) and not RE_TONE_POS.search(last_any):
-            tone = "FRUSTRATED"
+        if mask_last_any & TONE_POS_BIT and not mask_last_any & TONE_FRUS_BIT:
+            tone = TONE_POSITIVE
+        elif mask_last_any & TONE_FRUS_BIT and not mask_last_any & TONE_POS_BIT:
+            tone = TONE_FRUSTRATED
         else:
-            tone = "NEUTRAL"
+            tone = TONE_NEUTRAL
 
     # ---- Thread state ----
-    n = len(messages)
-    if RE_RESOLVED.search(last_any):
-        thread_state = "RESOLVED"
-    elif RE_FOLLOWUP.search(all_text) or n > 1:
-        thread_state = "FOLLOW-UP"
+    if mask_last_any & RESOLVED_BIT:
+        thread_state = STATE_RESOLVED
+    elif mask_all & FOLLOWUP_BIT or n_gt_1:
+        thread_state = STATE_FOLLOW_UP
     else:
-        thread_state = "NEW"
+        thread_state = STATE_NEW
+
+    return request_type, urgency, thread_state, scheduling, attachments, tone
+
+
+# ------------------------------
+# Core classification (thread-aware)
+# ------------------------------
+def classify_labels(subject: object, messages: Sequence[Mapping[str, Any]]) -> Dict[str, Any]:
+    """
+    Drop-in replacement: more robust bilingual rules & precedence.
+    """
+    # Duyệt body từ cuối lên: tail (3 body cuối) được quét trước nên biết sớm
+    # nhánh nào của ladder đã chốt; category không còn ảnh hưởng thì bỏ qua.
+    # Body cuối (last1) luôn xét đủ tone.
+    # Cố ý quét tuần tự: `re` (_sre) giữ GIL trong lúc match nên thread pool không
+    # chạy song song được, và việc bỏ category phụ thuộc thứ tự quét. Muốn tận
+    # dụng nhiều core thì chia theo thread (classify_thread.py --batch --jobs).
+    n = len(messages)
+    # body không phải str (vd. số) vẫn chiếm một chỗ trong tail nhưng coi như rỗng
+    bodies = [body for m in messages if (body := m.get("body"))]
+    last = len(bodies) - 1
+    tail_start = last - 2
+    mask_all = 0
+    mask_last_any = 0
+    mask_last1 = 0
+    want_all = _pending_all(0, 0, n)
+    want_tail = SCOPE_LAST_ANY
+    for i in range(last, -1, -1):
+        if i >= tail_start:
+            want = want_all | want_tail
+            if i == last:
+                want |= SCOPE_LAST1
+        elif not want_all:
+            break
+        else:
+            want = want_all
+        body = bodies[i]
+        mask = scan(body.lower() if isinstance(body, str) else "", want)
+        if not mask:
+            continue
+        mask_all |= mask
+        if i >= tail_start:
+            mask_last_any |= mask
+            if i == last:
+                mask_last1 = mask
+            want_tail = _pending_tail(mask_last_any)
+        want_all = _pending_all(mask_all, mask_last_any, n)
+    if want_all and isinstance(subject, str):
+        mask_all |= scan(subject.lower(), want_all)
 
+    request_type, urgency, thread_state, scheduling, attachments, tone = _decide(
+        mask_all & SCOPE_ALL, mask_last_any & SCOPE_LAST_ANY, mask_last1 & SCOPE_LAST1, n > 1
+    )
     return {
         "request_type": request_type,
         "urgency": urgency,
         "thread_state": thread_state,
         "scheduling": scheduling,
-        "attachments": attachments,
+        "attachments": list(attachments),
         "tone": tone,
     }
@@ -0,0 +1,15 @@
+import json
+import os
+import sys
+
+import pytest
+
+# email_classifier/ dùng import phẳng (`from rules import ...`), giống khi chạy script
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(TESTS_DIR), "email_classifier"))
+
+
+@pytest.fixture(scope="session")
+def scan_corpus():
+    with open(os.path.join(TESTS_DIR, "scan_corpus.json"), encoding="utf-8") as f:
+        return json.load(f)
@@ -0,0 +1,108 @@
+import io
+import json
+
+import pytest
+
+import classify_thread
+from classify_thread import classify_thread as classify
+
+
+def thread(subject, *bodies):
+    return {"thread": {
+        "subject": subject,
+        "messages": [
+            {"timestamp": f"2024-01-01T00:00:{i:02d}Z", "body": body}
+            for i, body in enumerate(bodies)
+        ],
+    }}
+
+
+@pytest.fixture(autouse=True)
+def clear_label_cache():
+    classify_thread._label_cache.clear()
+    yield
+    classify_thread._label_cache.clear()
+
+
+def test_tail_window_through_classify_thread():
+    result = classify(thread("Sync", "confirmed", "", "a", "b", "c"))
+    assert result["label"]["scheduling"] == "NO_MEETING"
+    result = classify(thread("Sync", "confirmed", "", "a", "b"))
+    assert result["label"]["scheduling"] == "CONFIRMED_TIME"
+
+
+def test_normalize_thread_fills_defaults_per_message():
+    subject, messages = classify_thread.normalize_thread(
+        {"messages": [{}, {"to": ["a@x"], "body": "hi"}, {}]}
+    )
+    assert subject == ""
+    assert messages[0] == {"timestamp": "", "from": "", "to": [], "body": ""}
+    assert messages[1]["to"] == ["a@x"] and messages[1]["body"] == "hi"
+    messages[0]["to"].append("b@x")
+    assert messages[2]["to"] == []
+
+
+def ndjson(*lines):
+    return io.BytesIO("".join(line + "\n" for line in lines).encode("utf-8"))
+
+
+def batch_lines(jobs, *lines):
+    out = io.BytesIO()
+    error = None
+    try:
+        classify_thread.run_batch(ndjson(*lines), out, jobs=jobs)
+    except ValueError as e:
+        error = e
+    return [json.loads(line) for line in out.getvalue().splitlines()], error
+
+
+def batch_input(count):
+    return [
+        json.dumps(thread(f"Thread {i}", "please review" if i % 3 else "asap", f"#{i}"))
+        for i in range(count)
+    ]
+
+
+def test_run_batch_keeps_input_order_and_skips_blank_lines():
+    lines = batch_input(5)
+    results, error = batch_lines(1, "", lines[0], "   ", *lines[1:], "")
+    assert error is None
+    assert results == [classify(json.loads(line)) for line in lines]
+
+
+def test_run_batch_reports_input_line_number():
+    results, error = batch_lines(1, batch_input(1)[0], "", "{bad")
+    assert len(results) == 1
+    assert "input line 3" in str(error)
+
+
+def test_run_batch_jobs_match_single_process(monkeypatch):
+    monkeypatch.setattr(classify_thread, "BATCH_CHUNKSIZE", 4)
+    lines = batch_input(30)
+    assert batch_lines(3, *lines) == batch_lines(1, *lines)
+
+
+@pytest.mark.parametrize("jobs", [1, 3])
+def test_run_batch_writes_good_lines_before_bad_one(jobs, monkeypatch):
+    # dòng lỗi nằm giữa một chunk: các dòng tốt trước nó vẫn phải được ghi ra
+    monkeypatch.setattr(classify_thread, "BATCH_CHUNKSIZE", 8)
+    lines = batch_input(13)
+    results, error = batch_lines(jobs, *lines, "{bad", *batch_input(3))
+    assert results == [classify(json.loads(line)) for line in lines]
+    assert "input line 14" in str(error)
+
+
+@pytest.mark.parametrize("argv", [
+    ["--in", "x.json", "--jobs", "2"],
+    ["--in", "x.ndjson", "--batch", "--jobs", "-1"],
+])
+def test_parse_args_rejects_bad_jobs(argv, capsys):
+    with pytest.raises(SystemExit) as exc:
+        classify_thread.parse_args(argv)
+    assert exc.value.code == 2
+    assert "--jobs" in capsys.readouterr().err
+
+
+def test_parse_args_jobs_defaults_to_unset():
+    assert classify_thread.parse_args(["--in", "x.ndjson", "--batch"]).jobs is None
+    assert classify_thread.parse_args(["--in", "x.ndjson", "--batch", "--jobs", "0"]).jobs == 0
@@ -0,0 +1,80 @@
+import pytest
+
+import classify_thread
+from classify_thread import classify_thread as classify
+
+
+def thread(subject, *bodies):
+    return {"thread": {
+        "subject": subject,
+        "messages": [
+            {"timestamp": f"2024-01-01T00:00:{i:02d}Z", "body": body}
+            for i, body in enumerate(bodies)
+        ],
+    }}
+
+
+@pytest.fixture(autouse=True)
+def clear_label_cache():
+    classify_thread._label_cache.clear()
+    yield
+    classify_thread._label_cache.clear()
+
+
+def test_cached_and_uncached_labels_agree(scan_corpus):
+    for i, body in enumerate(scan_corpus):
+        data = thread(scan_corpus[-1 - i], "earlier: no rush", body)
+        uncached = classify(data, use_cache=False)
+        assert classify(data) == uncached
+        assert classify(data) == uncached  # lần hai lấy từ cache
+
+
+def test_no_cache_leaves_cache_untouched():
+    classify(thread("please send the file", "hi"), use_cache=False)
+    assert not classify_thread._label_cache
+
+
+def test_cached_label_is_a_copy():
+    data = thread("please send the file", "hi")
+    classify(data)["label"]["attachments"].append("MUTATED")
+    assert classify(data)["label"]["attachments"] == ["EXPECTING_ATTACHMENT"]
+
+
+def test_same_thread_id_different_bodies_is_not_a_hit():
+    # thread_id chỉ phụ thuộc subject + timestamp; bodies_hash tách hai entry
+    before = classify(thread("Sync", "hello"))
+    after = classify(thread("Sync", "asap please"))
+    assert before["thread_id"] == after["thread_id"]
+    assert before["label"]["urgency"] == "STD-48H"
+    assert after["label"]["urgency"] == "URGENT-24H"
+    assert len(classify_thread._label_cache) == 2
+
+
+def test_non_str_body_is_cached_separately_from_str():
+    # 5 chiếm chỗ trong tail (đẩy "confirmed" ra), "" thì không
+    as_int = classify(thread("Sync", "confirmed", "x", "y", 5))
+    as_empty = classify(thread("Sync", "confirmed", "x", "y", ""))
+    assert as_int["thread_id"] == as_empty["thread_id"]
+    assert as_int["label"]["scheduling"] == "NO_MEETING"
+    assert as_empty["label"]["scheduling"] == "CONFIRMED_TIME"
+
+
+def _cached_subjects():
+    ids = {classify(thread(s), use_cache=False)["thread_id"]: s for s in "abc"}
+    return [ids[thread_id] for thread_id, _ in classify_thread._label_cache]
+
+
+def test_lru_evicts_oldest_entry(monkeypatch):
+    monkeypatch.setattr(classify_thread, "LABEL_CACHE_SIZE", 2)
+    for subject in "abc":
+        classify(thread(subject))
+    assert _cached_subjects() == ["b", "c"]
+
+
+def test_lru_hit_refreshes_entry(monkeypatch):
+    monkeypatch.setattr(classify_thread, "LABEL_CACHE_SIZE", 2)
+    classify(thread("a"))
+    classify(thread("b"))
+    classify(thread("a"))  # hit -> "a" thành mới nhất, "b" bị đẩy ra
+    classify(thread("c"))
+    assert _cached_subjects() == ["a", "c"]
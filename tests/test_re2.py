@@ -0,0 +1,102 @@
+import re
+from re import _parser as sre_parse
+
+import pytest
+
+from rules import SCAN_PLAN, _CASE_FOLD, _to_re2
+
+_WORD = re.compile(r"\w").match
+
+
+def _class_kinds(items):
+    """Tập {True: ký tự word, False: non-word} mà một lớp [...] có thể khớp."""
+    kinds = set()
+    for op, av in items:
+        if op is sre_parse.LITERAL:
+            kinds.add(bool(_WORD(chr(av))))
+        elif op is sre_parse.RANGE:
+            kinds.update(bool(_WORD(chr(c))) for c in range(av[0], av[1] + 1))
+        elif op is sre_parse.CATEGORY and av is sre_parse.CATEGORY_DIGIT:
+            kinds.add(True)
+        elif op is sre_parse.CATEGORY and av is sre_parse.CATEGORY_SPACE:
+            kinds.add(False)
+        else:  # NEGATE, \w, \W...: không phân tích, coi như có thể là cả hai
+            kinds.update((True, False))
+    return kinds
+
+
+def _edge(seq, last):
+    """(kinds, nullable): loại ký tự đầu (hoặc cuối nếu last) mà seq có thể khớp."""
+    kinds = set()
+    for op, av in reversed(seq) if last else seq:
+        nullable = False
+        if op is sre_parse.LITERAL:
+            kinds.add(bool(_WORD(chr(av))))
+        elif op is sre_parse.IN:
+            kinds |= _class_kinds(av)
+        elif op is sre_parse.CATEGORY:
+            kinds |= _class_kinds([(op, av)])
+        elif op is sre_parse.SUBPATTERN:
+            sub, nullable = _edge(av[3], last)
+            kinds |= sub
+        elif op is sre_parse.BRANCH:
+            for branch in av[1]:
+                sub, branch_nullable = _edge(branch, last)
+                kinds |= sub
+                nullable = nullable or branch_nullable
+        elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT):
+            sub, nullable = _edge(av[2], last)
+            kinds |= sub
+            nullable = nullable or av[0] == 0
+        elif op is sre_parse.AT:
+            nullable = True
+        else:
+            raise AssertionError(f"unhandled regex op {op}")
+        if not nullable:
+            return kinds, False
+    return kinds, True
+
+
+def _boundaries_next_to_word(seq):
+    """True nếu mỗi \\b trong seq chắc chắn có một bên là ký tự word."""
+    for i, (op, av) in enumerate(seq):
+        if op is sre_parse.AT and av is sre_parse.AT_BOUNDARY:
+            after, after_nullable = _edge(seq[i + 1:], last=False)
+            before, before_nullable = _edge(seq[:i], last=True)
+            if not ((after == {True} and not after_nullable)
+                    or (before == {True} and not before_nullable)):
+                return False
+        elif op is sre_parse.SUBPATTERN:
+            if not _boundaries_next_to_word(av[3]):
+                return False
+        elif op is sre_parse.BRANCH:
+            if not all(_boundaries_next_to_word(branch) for branch in av[1]):
+                return False
+        elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT):
+            if not _boundaries_next_to_word(av[2]):
+                return False
+    return True
+
+
+@pytest.mark.parametrize("name, source", [(name, source) for name, source, _, _ in SCAN_PLAN])
+def test_every_boundary_is_next_to_a_word_char(name, source):
+    # _to_re2 thay \b bằng một ranh giới "ăn" ký tự -- chỉ đúng khi điều này giữ
+    assert _boundaries_next_to_word(sre_parse.parse(source, re.IGNORECASE)), name
+
+
+def test_boundary_check_rejects_unanchored_boundary():
+    assert not _boundaries_next_to_word(sre_parse.parse(r"\b(?:ok|\.)\b"))
+    assert not _boundaries_next_to_word(sre_parse.parse(r"a\s*\b"))
+
+
+def test_re2_translation_matches_re(scan_corpus):
+    re2 = pytest.importorskip("re2")
+    for name, source, _, _ in SCAN_PLAN:
+        expected = re.compile(source, re.IGNORECASE).search
+        translated = re2.compile("(?i)" + _to_re2(source)).search
+        for text in scan_corpus:
+            text = text.lower()
+            # scan() gộp "ı"/"ſ" trước khi search (RE2 (?i) không gộp "ı")
+            assert bool(translated(text.translate(_CASE_FOLD))) == bool(expected(text)), (
+                name, text,
+            )
@@ -0,0 +1,270 @@
+import random
+from types import MappingProxyType
+
+import pytest
+
+from rules import (
+    ALL_BITS, BIT, PATTERNS, REQUEST_TYPE_INPUTS, REQUEST_TYPE_TABLE, SCOPE_ALL,
+    SCOPE_LAST1, SCOPE_LAST_ANY, _HAS_MEETING, _decide, classify_labels, scan,
+)
+
+
+def pattern_mask(text):
+    """Bitmask theo định nghĩa: search từng pattern công khai, không prefilter."""
+    mask = 0
+    for name, pat in PATTERNS:
+        if pat.search(text):
+            mask |= BIT[name]
+    return mask
+
+
+def reference_request_type(mask_all, scheduling):
+    """Nhánh request_type của ladder gốc, độc lập với _decide/REQUEST_TYPE_TABLE."""
+    def hit(name):
+        return mask_all & BIT[name]
+
+    if hit("meet") or scheduling in {"PROPOSED_TIME", "CONFIRMED_TIME", "RESCHEDULE"}:
+        return "SCHEDULE/MEET"
+    elif hit("expect") and not hit("attached"):
+        return "PROVIDE_DOCS"
+    elif hit("review"):
+        return "REVIEW/APPROVE"
+    elif hit("edit"):
+        return "EDIT/REVISE"
+    elif hit("provide_docs"):
+        return "PROVIDE_DOCS"
+    else:
+        return "INFO_ONLY"
+
+
+def reference_ladder(mask_all, mask_last_any, mask_last1, n):
+    """Bản chép ladder if/elif gốc, chỉ thay search(text) bằng bit trong mask."""
+    def hit(mask, name):
+        return mask & BIT[name]
+
+    # ---- Scheduling outcome (Confirm > Reschedule > Propose > None) ----
+    if hit(mask_last_any, "confirm"):
+        scheduling = "CONFIRMED_TIME"
+    elif hit(mask_last_any, "resched"):
+        scheduling = "RESCHEDULE"
+    elif hit(mask_all, "propose"):
+        scheduling = "PROPOSED_TIME"
+    else:
+        scheduling = "NO_MEETING"
+
+    request_type = reference_request_type(mask_all, scheduling)
+
+    # ---- Attachments (multi-label) ----
+    attachments = []
+    if hit(mask_all, "attached"):
+        attachments.append("ATTACHED")
+    if hit(mask_all, "expect"):
+        attachments.append("EXPECTING_ATTACHMENT")
+    if not attachments:
+        attachments = ["NONE_MENTIONED"]
+
+    # ---- Urgency ----
+    if hit(mask_all, "urgent"):
+        urgency = "URGENT-24H"
+    elif hit(mask_all, "low"):
+        urgency = "LOW-120H"
+    else:
+        urgency = "STD-48H"
+
+    # ---- Tone (prefer last message) ----
+    if hit(mask_last1, "tone_frus") and not hit(mask_last1, "tone_pos"):
+        tone = "FRUSTRATED"
+    elif hit(mask_last1, "tone_pos") and not hit(mask_last1, "tone_frus"):
+        tone = "POSITIVE"
+    else:
+        if hit(mask_last_any, "tone_pos") and not hit(mask_last_any, "tone_frus"):
+            tone = "POSITIVE"
+        elif hit(mask_last_any, "tone_frus") and not hit(mask_last_any, "tone_pos"):
+            tone = "FRUSTRATED"
+        else:
+            tone = "NEUTRAL"
+
+    # ---- Thread state ----
+    if hit(mask_last_any, "resolved"):
+        thread_state = "RESOLVED"
+    elif hit(mask_all, "followup") or n > 1:
+        thread_state = "FOLLOW-UP"
+    else:
+        thread_state = "NEW"
+
+    return {
+        "request_type": request_type,
+        "urgency": urgency,
+        "thread_state": thread_state,
+        "scheduling": scheduling,
+        "attachments": attachments,
+        "tone": tone,
+    }
+
+
+def reference_labels(subject, messages):
+    """classify_labels không pruning: quét mọi body, tail = 3 body khác rỗng cuối."""
+    bodies = [b for m in messages if (b := m.get("body"))]
+    masks = [pattern_mask(b.lower()) if isinstance(b, str) else 0 for b in bodies]
+    mask_all = 0
+    for mask in masks:
+        mask_all |= mask
+    if isinstance(subject, str):
+        mask_all |= pattern_mask(subject.lower())
+    mask_last_any = 0
+    for mask in masks[-3:]:
+        mask_last_any |= mask
+    mask_last1 = masks[-1] if masks else 0
+    return reference_ladder(mask_all, mask_last_any, mask_last1, len(messages))
+
+
+def msgs(*bodies):
+    return [{"body": body} for body in bodies]
+
+
+# ---------------- scan() vs PATTERNS ----------------
+
+def test_corpus_fires_every_category(scan_corpus):
+    seen = 0
+    for text in scan_corpus:
+        seen |= pattern_mask(text.lower())
+    assert seen == ALL_BITS
+
+
+def test_scan_matches_patterns(scan_corpus):
+    for text in scan_corpus:
+        text = text.lower()
+        assert scan(text) == pattern_mask(text), text
+
+
+def test_scan_want_limits_categories(scan_corpus):
+    for text in scan_corpus:
+        text = text.lower()
+        expected = pattern_mask(text)
+        for name, bit in BIT.items():
+            assert scan(text, bit) == expected & bit, (name, text)
+
+
+def test_scan_dotless_i_and_long_s():
+    assert scan("please send the fıle") & BIT["expect"]
+    assert scan("ıssue with build") & BIT["tone_frus"]
+    assert scan("ſorry") & BIT["tone_frus"]
+
+
+# ---------------- classify_labels ----------------
+
+def test_tail_is_last_three_non_empty_bodies():
+    # "confirmed" là body khác rỗng thứ 4 tính từ cuối -> ngoài tail
+    messages = msgs("confirmed", "", "one", None, "two", "three")
+    assert classify_labels("", messages)["scheduling"] == "NO_MEETING"
+    # body rỗng/None không chiếm chỗ trong tail
+    messages = msgs("x", "confirmed", "", "two", None, "three")
+    assert classify_labels("", messages)["scheduling"] == "CONFIRMED_TIME"
+
+
+def test_last1_tone_wins_over_tail():
+    messages = msgs("sorry for the delay", "thanks!")
+    assert classify_labels("", messages)["tone"] == "POSITIVE"
+    messages = msgs("thanks!", "sorry for the delay")
+    assert classify_labels("", messages)["tone"] == "FRUSTRATED"
+
+
+def test_non_str_bodies_count_as_empty_in_tail():
+    # 5 là body cuối: last1 rỗng nên tone lấy từ tail; nó vẫn chiếm một chỗ,
+    # đẩy "confirmed" ra khỏi tail
+    messages = msgs("confirmed", "thanks", "ok then", 5)
+    labels = classify_labels("", messages)
+    assert labels["tone"] == "POSITIVE"
+    assert labels["scheduling"] == "CONFIRMED_TIME"
+    messages = msgs("confirmed", "thanks", "fine", 5)
+    assert classify_labels("", messages)["scheduling"] == "NO_MEETING"
+    assert classify_labels("", msgs(5, ["x"], {"a": 1})) == reference_labels(
+        "", msgs(5, ["x"], {"a": 1})
+    )
+    assert classify_labels(None, msgs(None, 0, False))["request_type"] == "INFO_ONLY"
+
+
+def subsets(bits):
+    sub = bits
+    while True:
+        yield sub
+        if not sub:
+            return
+        sub = (sub - 1) & bits
+
+
+def test_decide_matches_original_ladder_on_every_mask():
+    for mask_all in subsets(SCOPE_ALL):
+        for mask_last_any in subsets(SCOPE_LAST_ANY):
+            for mask_last1 in subsets(mask_last_any & SCOPE_LAST1):
+                for n in (1, 2):
+                    labels = reference_ladder(mask_all, mask_last_any, mask_last1, n)
+                    decided = _decide(mask_all, mask_last_any, mask_last1, n > 1)
+                    assert decided == (
+                        labels["request_type"], labels["urgency"], labels["thread_state"],
+                        labels["scheduling"], tuple(labels["attachments"]), labels["tone"],
+                    ), (mask_all, mask_last_any, mask_last1, n)
+
+
+def test_request_type_table_matches_original_priority():
+    assert set(REQUEST_TYPE_TABLE) == set(subsets(REQUEST_TYPE_INPUTS))
+    for key, request_type in REQUEST_TYPE_TABLE.items():
+        scheduling = "PROPOSED_TIME" if key & _HAS_MEETING else "NO_MEETING"
+        assert request_type == reference_request_type(key & ~_HAS_MEETING, scheduling), key
+
+
+@pytest.mark.parametrize("bodies, request_type", [
+    (("please send me the file, attached is the draft, please review",), "REVIEW/APPROVE"),
+    (("please edit the doc",), "EDIT/REVISE"),
+    (("please send me the file and review it",), "PROVIDE_DOCS"),
+    (("draft attached, see the doc",), "PROVIDE_DOCS"),
+    (("review the doc on a call",), "SCHEDULE/MEET"),
+    (("please review", "confirmed"), "SCHEDULE/MEET"),
+    (("please review", "can we postpone"), "SCHEDULE/MEET"),
+    (("please review and edit",), "REVIEW/APPROVE"),
+    (("fyi",), "INFO_ONLY"),
+])
+def test_request_type_priority(bodies, request_type):
+    assert classify_labels("", msgs(*bodies))["request_type"] == request_type
+
+
+def test_accepts_any_sequence_of_mappings():
+    # mypyc kiểm tra annotation lúc chạy -> tuple/Mapping/subject None phải qua được
+    messages = (MappingProxyType({"body": "please review"}), {"body": "thanks"})
+    expected = reference_labels(None, list(messages))
+    assert classify_labels(None, messages) == expected
+    assert classify_labels(b"urgent", messages) == expected
+
+
+@pytest.mark.parametrize("subject, bodies, expected", [
+    # urgent ở body cuối -> LOW phía trước bị bỏ qua, kết quả vẫn URGENT
+    ("", ("no rush", "need it asap"), {"urgency": "URGENT-24H"}),
+    ("no rush", ("fyi",), {"urgency": "LOW-120H"}),
+    # confirm trong tail chốt scheduling -> propose/request phía trước không đổi kết quả
+    ("", ("please review the doc", "monday?", "confirmed"),
+     {"scheduling": "CONFIRMED_TIME", "request_type": "SCHEDULE/MEET"}),
+    # confirm thắng resched trong tail
+    ("", ("can we postpone", "ok, confirmed"), {"scheduling": "CONFIRMED_TIME"}),
+    # subject chỉ còn được quét cho những bit SCOPE_ALL chưa chốt
+    ("URGENT: file", ("please send me the file",),
+     {"urgency": "URGENT-24H", "request_type": "PROVIDE_DOCS",
+      "attachments": ["EXPECTING_ATTACHMENT"]}),
+    ("Follow-up", ("hello",), {"thread_state": "FOLLOW-UP"}),
+    ("Follow-up", ("hello", "resolved"), {"thread_state": "RESOLVED"}),
+])
+def test_pruned_categories_do_not_change_labels(subject, bodies, expected):
+    labels = classify_labels(subject, msgs(*bodies))
+    assert labels == reference_labels(subject, msgs(*bodies))
+    for key, value in expected.items():
+        assert labels[key] == value
+
+
+def test_classify_labels_matches_unpruned_reference(scan_corpus):
+    rng = random.Random(20241015)
+    pool = scan_corpus + ["", None, 5]
+    for _ in range(2000):
+        subject = rng.choice(scan_corpus)
+        messages = msgs(*(rng.choice(pool) for _ in range(rng.randint(0, 7))))
+        assert classify_labels(subject, messages) == reference_labels(subject, messages), (
+            subject, messages,
+        )